@@ -46,6 +46,8 @@ class ConfigManager(object):
 
     def __init__(self, config_file=None, state_dir=None):
         self.__configs = {}
+        self.__configs_cache = {}
+        self.__configured_service_names = None
         self.state_dir = None
         if state_dir is not None:
             # convert from pathlib.Path
@@ -202,8 +204,13 @@ class ConfigManager(object):
         gravity.io.debug(f"Loaded instance {config.instance_name} from Gravity config file: {config.gravity_config_file}")
 
         self.__configs[config.instance_name] = config
+        self.__invalidate_caches()
         return config
 
+    def __invalidate_caches(self):
+        self.__configs_cache.clear()
+        self.__configured_service_names = None
+
     def create_static_handler_services(self, config: ConfigFile, app_config: dict):
         assign_with = None
         if not app_config.get("job_config_file") and app_config.get("job_config"):
@@ -333,12 +340,18 @@ class ConfigManager(object):
 
     def get_configs(self, instances=None, process_manager=None):
         """Return the persisted values of all config files registered with the config manager."""
+        key = (frozenset(instances) if instances is not None else None, process_manager)
+        try:
+            return list(self.__configs_cache[key])
+        except KeyError:
+            pass
         rval = []
         for instance_name, config in list(self.__configs.items()):
             if ((instances is not None and instance_name in instances) or instances is None) and (
                 (process_manager is not None and config.process_manager == process_manager) or process_manager is None
             ):
                 rval.append(config)
+        self.__configs_cache[key] = tuple(rval)
         return rval
 
     def get_config(self, instance_name=None):
@@ -354,11 +367,13 @@ class ConfigManager(object):
             gravity.io.exception(f"Unknown instance name: {instance_name}")
 
     def get_configured_service_names(self):
-        rval = set()
-        for config in self.get_configs():
-            for service in config.services:
-                rval.add(service.service_name)
-        return rval
+        if self.__configured_service_names is None:
+            rval = set()
+            for config in self.get_configs():
+                for service in config.services:
+                    rval.add(service.service_name)
+            self.__configured_service_names = frozenset(rval)
+        return self.__configured_service_names
 
     def get_configured_instance_names(self):
         return list(self.__configs.keys())
@@ -5,10 +5,12 @@ import errno
 import importlib
 import inspect
 import os
+import secrets
 import shlex
+import stat
 import sys
 from abc import ABCMeta, abstractmethod
-from functools import partial, wraps
+from functools import lru_cache, partial, wraps
 
 import gravity.io
 from gravity.config_manager import ConfigManager
@@ -16,6 +18,9 @@ from gravity.settings import DEFAULT_INSTANCE_NAME, ServiceCommandStyle
 from gravity.state import VALID_SERVICE_NAMES
 from gravity.util import which
 
+FILE_COMPARE_STREAM_SIZE = 64 * 1024
+FILE_COMPARE_CHUNK_SIZE = 4096
+
 
 @contextlib.contextmanager
 def process_manager(*args, **kwargs):
@@ -26,6 +31,11 @@ def process_manager(*args, **kwargs):
         pm.terminate()
 
 
+@lru_cache(maxsize=None)
+def _param_names(func):
+    return frozenset(inspect.signature(func).parameters)
+
+
 def _route(func, all_process_managers=False):
     """Given instance names, populates kwargs with instance configs for the given PM, and calls the PM-routed function
     """
@@ -46,7 +56,7 @@ def _route(func, all_process_managers=False):
             pm_names = configs_by_pm.keys()
         for pm_name in pm_names:
             routed_func = getattr(self.process_managers[pm_name], func.__name__)
-            routed_func_params = list(inspect.signature(routed_func).parameters)
+            routed_func_params = _param_names(getattr(routed_func, "__func__", routed_func))
             if "configs" in routed_func_params:
                 pm_configs = configs_by_pm.get(pm_name, [])
                 kwargs["configs"] = pm_configs
@@ -64,10 +74,29 @@ route = partial(_route, all_process_managers=False)
 route_to_all = partial(_route, all_process_managers=True)
 
 
+@lru_cache(maxsize=1)
+def _discover_pm_classes():
+    """Import the process manager modules in this package and return their process manager classes
+
+    The set of process managers is fixed at install time, so the directory scan and class introspection are only
+    performed once per process.
+    """
+    pm_classes = []
+    with os.scandir(os.path.dirname(__file__)) as entries:
+        filenames = sorted(entry.name for entry in entries if entry.is_file())
+    for filename in filenames:
+        if filename.endswith(".py") and not filename.startswith("_"):
+            mod = importlib.import_module("gravity.process_manager." + filename[: -len(".py")])
+            for name in dir(mod):
+                obj = getattr(mod, name)
+                if not name.startswith("_") and inspect.isclass(obj) and issubclass(obj, BaseProcessManager) and obj != BaseProcessManager:
+                    pm_classes.append(obj)
+    return tuple(pm_classes)
+
+
 class BaseProcessExecutionEnvironment(metaclass=ABCMeta):
     def __init__(self, state_dir=None, config_file=None, config_manager=None, **kwargs):
         self.config_manager = config_manager or ConfigManager(state_dir=state_dir, config_file=config_file)
-        self.tail = which("tail")
 
     @abstractmethod
     def _service_environment_formatter(self, environment, format_vars):
@@ -79,17 +108,21 @@ class BaseProcessExecutionEnvironment(metaclass=ABCMeta):
     def _service_program_name(self, instance_name, service):
         return f"{instance_name}_{service.service_type}_{service.service_name}"
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _virtualenv_bin(virtualenv_dir):
+        # the same for every service of a config, and usually for every config
+        return shlex.quote(f'{os.path.join(virtualenv_dir, "bin")}{os.path.sep}') if virtualenv_dir else ""
+
     def _service_format_vars(self, config, service, pm_format_vars=None):
         pm_format_vars = pm_format_vars or {}
-        virtualenv_dir = config.virtualenv
-        virtualenv_bin = shlex.quote(f'{os.path.join(virtualenv_dir, "bin")}{os.path.sep}') if virtualenv_dir else ""
 
         format_vars = {
             "server_name": service.service_name,
             "galaxy_umask": service.settings.get("umask") or config.umask,
             "galaxy_conf": config.galaxy_config_file,
             "galaxy_root": config.galaxy_root,
-            "virtualenv_bin": virtualenv_bin,
+            "virtualenv_bin": self._virtualenv_bin(config.virtualenv),
             "gravity_data_dir": shlex.quote(config.gravity_data_dir),
             "app_config": config.app_config,
         }
@@ -103,7 +136,7 @@ class BaseProcessExecutionEnvironment(metaclass=ABCMeta):
         # template the command template
         if config.service_command_style in (ServiceCommandStyle.direct, ServiceCommandStyle.exec):
             format_vars["command_arguments"] = service.get_command_arguments(format_vars)
-            format_vars["command"] = service.command_template.format(**format_vars)
+            format_vars["command"] = service.command_template.format_map(format_vars)
 
             # template env vars
             environment = service.environment
@@ -134,7 +167,15 @@ class BaseProcessExecutionEnvironment(metaclass=ABCMeta):
 class BaseProcessManager(BaseProcessExecutionEnvironment, metaclass=ABCMeta):
     def __init__(self, *args, foreground=False, **kwargs):
         super().__init__(*args, **kwargs)
-        self._service_changes = None
+        self._service_changes = False
+        self.__tail = None
+
+    @property
+    def tail(self):
+        # only needed by follow, so avoid searching $PATH until then
+        if self.__tail is None:
+            self.__tail = which("tail")
+        return self.__tail
 
     @property
     def _use_instance_name(self):
@@ -150,9 +191,10 @@ class BaseProcessManager(BaseProcessExecutionEnvironment, metaclass=ABCMeta):
         self._disable_and_remove_pm_files(unintended_pm_files)
 
     def _remove_all_pm_files_for_configs(self, configs):
+        pm_files = set()
         for config in configs:
-            pm_files = self._present_pm_files_for_config(config)
-            self._disable_and_remove_pm_files(pm_files)
+            pm_files.update(self._present_pm_files_for_config(config))
+        self._disable_and_remove_pm_files(pm_files)
 
     def _remove_all_pm_files(self):
         # the kevin uxbridge method
@@ -184,23 +226,64 @@ class BaseProcessManager(BaseProcessExecutionEnvironment, metaclass=ABCMeta):
             if exc.errno != errno.EEXIST:
                 raise
 
-    def _file_needs_update(self, path, contents):
+    def _file_needs_update(self, path, contents, stat_result=None):
         """Update if contents differ"""
-        if os.path.exists(path):
-            # check first whether there are changes
-            with open(path) as fh:
+        if stat_result is None:
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                return True
+        # files are always written as UTF-8 regardless of the locale, so that the size comparison is reliable
+        encoded_contents = contents.encode("utf-8")
+        # files of a different size have changed, no need to read them
+        if stat_result.st_size != len(encoded_contents):
+            return True
+        if stat_result.st_size < FILE_COMPARE_STREAM_SIZE:
+            with open(path, encoding="utf-8") as fh:
                 existing_contents = fh.read()
             return existing_contents != contents
-        return True
+        # compare large files in chunks, stopping at the first difference
+        encoded_contents = memoryview(encoded_contents)
+        with open(path, "rb") as fh:
+            for offset in range(0, len(encoded_contents), FILE_COMPARE_CHUNK_SIZE):
+                if fh.read(FILE_COMPARE_CHUNK_SIZE) != encoded_contents[offset:offset + FILE_COMPARE_CHUNK_SIZE]:
+                    return True
+        return False
+
+    def _write_file(self, path, contents, stat_result=None):
+        """Atomically replace path with contents so that an interrupted write cannot leave a truncated file"""
+        # the temp file is hidden and does not have the extension of any file type that gravity or the process
+        # managers read, and the mode is subject to the umask like a file created with open(). if path is a symlink, the
+        # file it points to is replaced rather than the link itself.
+        path = os.path.realpath(path)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{secrets.token_hex(8)}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                out.write(contents)
+                out.flush()
+                os.fsync(out.fileno())
+            if stat_result is not None:
+                # preserve the mode and, if we are able to, the ownership of the file being replaced
+                if self.config_manager.is_root:
+                    os.chown(tmp_path, stat_result.st_uid, stat_result.st_gid)
+                os.chmod(tmp_path, stat.S_IMODE(stat_result.st_mode))
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
 
     def _update_file(self, path, contents, name, file_type, force):
-        if force or self._file_needs_update(path, contents):
-            verb = "Updating" if os.path.exists(path) else "Adding"
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            stat_result = None
+        if force or stat_result is None or self._file_needs_update(path, contents, stat_result=stat_result):
+            verb = "Updating" if stat_result is not None else "Adding"
             gravity.io.info(f"{verb} {file_type} {name}")
             self._create_dir_for(path)
-            with open(path, "w") as out:
-                out.write(contents)
-            self._service_changes = True
+            self._write_file(path, contents, stat_result=stat_result)
             return True
         else:
             gravity.io.debug(f"No changes to existing config for {file_type} {name}: {path}")
@@ -249,7 +332,7 @@ class BaseProcessManager(BaseProcessExecutionEnvironment, metaclass=ABCMeta):
 
 class ProcessExecutor(BaseProcessExecutionEnvironment):
     def _service_environment_formatter(self, environment, format_vars):
-        return {k: v.format(**format_vars) for k, v in environment.items()}
+        return {k: v.format_map(format_vars) for k, v in environment.items()}
 
     def exec(self, config, service, service_instance_number=None, no_exec=False):
         service_name = service.service_name
@@ -298,25 +381,20 @@ class ProcessManagerRouter:
 
     def _load_pm_modules(self, *args, **kwargs):
         self.process_managers = {}
-        for filename in os.listdir(os.path.dirname(__file__)):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                mod = importlib.import_module("gravity.process_manager." + filename[: -len(".py")])
-                for name in dir(mod):
-                    obj = getattr(mod, name)
-                    if not name.startswith("_") and inspect.isclass(obj) and issubclass(obj, BaseProcessManager) and obj != BaseProcessManager:
-                        pm = obj(*args, config_manager=self.config_manager, **kwargs)
-                        self.process_managers[pm.name] = pm
+        for pm_class in _discover_pm_classes():
+            pm = pm_class(*args, config_manager=self.config_manager, **kwargs)
+            self.process_managers[pm.name] = pm
 
     def _instance_service_names(self, names):
         instance_names = []
         service_names = []
-        configured_instance_names = self.config_manager.get_configured_instance_names()
-        configured_service_names = self.config_manager.get_configured_service_names()
         if names:
+            configured_instance_names = frozenset(self.config_manager.get_configured_instance_names())
+            valid_service_names = self.config_manager.get_configured_service_names() | VALID_SERVICE_NAMES
             for name in names:
                 if name in configured_instance_names:
                     instance_names.append(name)
-                elif name in configured_service_names | VALID_SERVICE_NAMES:
+                elif name in valid_service_names:
                     service_names.append(name)
                 else:
                     gravity.io.warn(f"Warning: Not a known instance or service name: {name}")
@@ -334,17 +412,17 @@ class ProcessManagerRouter:
             gravity.io.exception("Only zero or one instance name can be provided")
 
         config = self.config_manager.get_configs(instances=instance_names)[0]
-        service_list = ", ".join(s.service_name for s in config.services)
+        services_by_name = {s.service_name: s for s in config.services}
+        service_list = ", ".join(services_by_name)
 
         if len(service_names) != 1:
             gravity.io.exception(f"Exactly one service name must be provided. Configured service(s): {service_list}")
 
         service_name = service_names[0]
-        services = config.get_services(service_names)
-        if not services:
+        service = services_by_name.get(service_name)
+        if service is None:
             gravity.io.exception(f"Service '{service_name}' is not configured. Configured service(s): {service_list}")
 
-        service = services[0]
         return self._process_executor.exec(config, service, service_instance_number=service_instance_number, no_exec=no_exec)
 
     @route
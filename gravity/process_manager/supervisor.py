@@ -11,7 +11,7 @@ import gravity.io
 from gravity.process_manager import BaseProcessManager
 from gravity.settings import ProcessManager
 from gravity.state import GracefulMethod
-from gravity.util import which
+from gravity.util import INOTIFY_AVAILABLE, follow_files, which
 
 from supervisor import supervisorctl  # type: ignore
 
@@ -183,7 +183,7 @@ class SupervisorProcessManager(BaseProcessManager):
             # any time that supervisord is not running, let's rewrite supervisord.conf
             if not os.path.exists(self.supervisord_conf_dir):
                 os.makedirs(self.supervisord_conf_dir)
-            open(self.supervisord_conf_path, "w").write(SUPERVISORD_CONF_TEMPLATE.format(**format_vars))
+            self._write_file(self.supervisord_conf_path, SUPERVISORD_CONF_TEMPLATE.format_map(format_vars))
             self.__supervisord_popen = subprocess.Popen(supervisord_cmd, env=os.environ)
             rc = self.__supervisord_popen.poll()
             if rc:
@@ -208,7 +208,7 @@ class SupervisorProcessManager(BaseProcessManager):
         return "%(ENV_PATH)s"
 
     def _service_environment_formatter(self, environment, format_vars):
-        return ",".join("{}={}".format(k, shlex.quote(v.format(**format_vars))) for k, v in environment.items())
+        return ",".join("{}={}".format(k, shlex.quote(v.format_map(format_vars))) for k, v in environment.items())
 
     def terminate(self):
         if self.foreground:
@@ -267,7 +267,7 @@ class SupervisorProcessManager(BaseProcessManager):
 
         conf = os.path.join(instance_conf_dir, program.config_file_name)
         template = SUPERVISORD_SERVICE_TEMPLATE
-        contents = template.format(**format_vars)
+        contents = template.format_map(format_vars)
         name = service.service_name if not self._use_instance_name else f"{instance_name}:{service.service_name}"
         if self._update_file(conf, contents, name, "service", force):
             self.supervisorctl('reread')
@@ -289,7 +289,7 @@ class SupervisorProcessManager(BaseProcessManager):
         group_conf = os.path.join(self.supervisord_conf_dir, f"group_{instance_name}.conf")
         if self._use_instance_name:
             format_vars = {"instance_name": instance_name, "programs": ",".join(programs)}
-            contents = SUPERVISORD_GROUP_TEMPLATE.format(**format_vars)
+            contents = SUPERVISORD_GROUP_TEMPLATE.format_map(format_vars)
             if self._update_file(group_conf, contents, instance_name, "supervisor group", force):
                 self.supervisorctl('reread')
         elif os.path.exists(group_conf):
@@ -342,22 +342,22 @@ class SupervisorProcessManager(BaseProcessManager):
     def follow(self, configs=None, service_names=None, quiet=False):
         # supervisor has a built-in tail command but it only works on a single log file. `galaxyctl pm tail ...` can be
         # used if desired, though
-        if not self.tail:
-            gravity.io.exception("`tail` not found on $PATH, please install it")
         log_files = []
         if quiet:
-            cmd = [self.tail, "-f", self.log_file]
-            tail_popen = subprocess.Popen(cmd)
-            tail_popen.wait()
+            log_files.append(self.log_file)
         else:
             for config in configs:
                 log_dir = config.log_dir
                 programs = self.__supervisor_programs(config, service_names)
                 for program in programs:
                     log_files.extend(os.path.join(log_dir, f) for f in program.log_file_names)
-            cmd = [self.tail, "-f"] + log_files
-            tail_popen = subprocess.Popen(cmd)
-            tail_popen.wait()
+        if INOTIFY_AVAILABLE and follow_files(log_files):
+            return
+        if not self.tail:
+            gravity.io.exception("`tail` not found on $PATH, please install it")
+        cmd = [self.tail, "-f"] + log_files
+        tail_popen = subprocess.Popen(cmd)
+        tail_popen.wait()
 
     def start(self, configs=None, service_names=None):
         self.update(configs=configs)
@@ -4,8 +4,10 @@ import os
 import re
 import shlex
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from glob import glob
 from functools import partial
+from itertools import chain
 
 import gravity.io
 from gravity.process_manager import BaseProcessManager
@@ -13,6 +15,8 @@ from gravity.settings import ProcessManager
 from gravity.state import GracefulMethod
 
 SYSTEMD_TARGET_HASH_RE = r";\s*GRAVITY=([0-9a-f]+)"
+SYSTEMD_UNIT_FILE_RE = re.compile(r"galaxy-.*\.(?:service|target)|galaxy\.target")
+PROCESS_CONFIGS_MAX_WORKERS = 8
 
 SYSTEMD_SERVICE_TEMPLATE = """;
 ; This file is maintained by Gravity - CHANGES WILL BE OVERWRITTEN
@@ -85,23 +89,14 @@ class SystemdService:
         self.unit_prefix = f"galaxy{prefix_instance_name}-{service.service_name}"
         self.description = f"Galaxy{description_instance_name}{service.service_name}{description_process}"
 
-    @property
-    def unit_file_name(self):
-        instance_count = self.service.count
-        if instance_count > 1:
-            return f"{self.unit_prefix}@.service"
-        else:
-            return f"{self.unit_prefix}.service"
-
-    @property
-    def unit_names(self):
-        """The representation when performing commands, after instance expansion"""
         instance_count = self.service.count
         if instance_count > 1:
-            unit_names = [f"{self.unit_prefix}@{i}.service" for i in range(0, instance_count)]
+            self.unit_file_name = f"{self.unit_prefix}@.service"
+            # the representation when performing commands, after instance expansion
+            self.unit_names = [f"{self.unit_prefix}@{i}.service" for i in range(0, instance_count)]
         else:
-            unit_names = [f"{self.unit_prefix}.service"]
-        return unit_names
+            self.unit_file_name = f"{self.unit_prefix}.service"
+            self.unit_names = [self.unit_file_name]
 
 
 class SystemdProcessManager(BaseProcessManager):
@@ -111,6 +106,9 @@ class SystemdProcessManager(BaseProcessManager):
     def __init__(self, foreground=False, **kwargs):
         super(SystemdProcessManager, self).__init__(**kwargs)
         self.user_mode = not self.config_manager.is_root
+        self.__systemd_services = {}
+        self.__unit_names_cache = {}
+        self.__default_path = None
 
     @property
     def __systemd_unit_dir(self):
@@ -139,6 +137,17 @@ class SystemdProcessManager(BaseProcessManager):
             if ignore_rc is None or exc.returncode not in ignore_rc:
                 raise
 
+    def __systemd_service(self, config, service):
+        # services are not hashable, but configs and services live for the lifetime of the config manager
+        use_instance_name = self._use_instance_name
+        key = (id(config), id(service), use_instance_name)
+        try:
+            return self.__systemd_services[key]
+        except KeyError:
+            systemd_service = SystemdService(config, service, use_instance_name)
+            self.__systemd_services[key] = systemd_service
+            return systemd_service
+
     def __journalctl(self, *args, **kwargs):
         args = list(args)
         if self.user_mode:
@@ -147,13 +156,17 @@ class SystemdProcessManager(BaseProcessManager):
         subprocess.check_call(["journalctl"] + args)
 
     def _service_default_path(self):
-        environ = self.__systemctl("show-environment", capture=True)
-        for line in environ.splitlines():
-            if line.startswith("PATH="):
-                return line.split("=", 1)[1]
+        # the systemd manager environment does not change during a run, so only query it once
+        if self.__default_path is None:
+            environ = self.__systemctl("show-environment", capture=True)
+            for line in environ.splitlines():
+                if line.startswith("PATH="):
+                    self.__default_path = line.split("=", 1)[1]
+                    break
+        return self.__default_path
 
     def _service_environment_formatter(self, environment, format_vars):
-        return "\n".join("Environment={}={}".format(k, shlex.quote(v.format(**format_vars))) for k, v in environment.items())
+        return "\n".join("Environment={}={}".format(k, shlex.quote(v.format_map(format_vars))) for k, v in environment.items())
 
     def terminate(self):
         # this is used to stop a foreground supervisord in the supervisor PM, so it is a no-op here
@@ -164,7 +177,7 @@ class SystemdProcessManager(BaseProcessManager):
         return f"galaxy{instance_name}.target"
 
     def __unit_files_to_active_unit_names(self, unit_files):
-        unit_names = []
+        unit_args = []
         for unit_file in unit_files:
             unit_file = os.path.basename(unit_file)
             if "@" in unit_file:
@@ -172,13 +185,16 @@ class SystemdProcessManager(BaseProcessManager):
                 unit_arg = unit_file[:at_position + 1] + "*" + unit_file[at_position + 1:]
             else:
                 unit_arg = unit_file
-            list_output = self.__systemctl("list-units", "--plain", "--no-legend", unit_arg, capture=True)
-            unit_names.extend(line.split()[0] for line in list_output.splitlines())
-        return unit_names
+            unit_args.append(unit_arg)
+        if not unit_args:
+            return []
+        list_output = self.__systemctl("list-units", "--plain", "--no-legend", *unit_args, capture=True)
+        return [line.split()[0] for line in list_output.splitlines()]
 
     def _disable_and_remove_pm_files(self, unit_files):
-        for target in [u for u in unit_files if u.endswith(".target")]:
-            self.__systemctl("disable", "--now", os.path.basename(target))
+        targets = [os.path.basename(u) for u in unit_files if u.endswith(".target")]
+        if targets:
+            self.__systemctl("disable", "--now", *targets)
         # stopping all the targets should also stop all the services, but we'll check to be sure
         active_unit_names = self.__unit_files_to_active_unit_names(unit_files)
         if active_unit_names:
@@ -216,18 +232,22 @@ class SystemdProcessManager(BaseProcessManager):
     def _intended_pm_files_for_config(self, config):
         unit_files = set()
         for service in config.services:
-            systemd_service = SystemdService(config, service, self._use_instance_name)
+            systemd_service = self.__systemd_service(config, service)
             unit_files.add(os.path.join(self.__systemd_unit_dir, systemd_service.unit_file_name))
         target_unit_name = self.__target_unit_name(config)
         unit_files.add(os.path.join(self.__systemd_unit_dir, target_unit_name))
         return unit_files
 
     def _all_present_pm_files(self):
-        return (glob(os.path.join(self.__systemd_unit_dir, "galaxy-*.service")) +
-                glob(os.path.join(self.__systemd_unit_dir, "galaxy-*.target")) +
-                glob(os.path.join(self.__systemd_unit_dir, "galaxy.target")))
+        # scan the unit dir once rather than once per pattern
+        try:
+            with os.scandir(self.__systemd_unit_dir) as entries:
+                return [entry.path for entry in entries if SYSTEMD_UNIT_FILE_RE.fullmatch(entry.name)]
+        except FileNotFoundError:
+            return []
 
-    def __update_service(self, config, service, systemd_service: SystemdService, force: bool):
+    def __config_format_vars(self, config):
+        """systemd-specific format vars that are the same for all of a config's services"""
         # under supervisor we expect that gravity is installed in the galaxy venv and the venv is active when gravity
         # runs, but under systemd this is not the case. we do assume $VIRTUAL_ENV is the galaxy venv if running as an
         # unprivileged user, though.
@@ -240,6 +260,19 @@ class SystemdProcessManager(BaseProcessManager):
         elif not virtualenv_dir:
             gravity.io.exception("The `virtualenv` Gravity config option must be set when using the systemd process manager")
 
+        config_format_vars = {
+            "virtualenv_bin": self._virtualenv_bin(virtualenv_dir),
+            "instance_number": "%i",
+            "systemd_user_group": "",
+            "systemd_target": self.__target_unit_name(config),
+        }
+        if not self.user_mode:
+            config_format_vars["systemd_user_group"] = f"User={config.galaxy_user}"
+            if config.galaxy_group is not None:
+                config_format_vars["systemd_user_group"] += f"\nGroup={config.galaxy_group}"
+        return config_format_vars
+
+    def __update_service(self, config, service, systemd_service: SystemdService, config_format_vars, force: bool):
         memory_limit = service.settings.get("memory_limit") or config.memory_limit
         if memory_limit:
             memory_limit = f"MemoryLimit={memory_limit}G"
@@ -250,32 +283,32 @@ class SystemdProcessManager(BaseProcessManager):
 
         # systemd-specific format vars
         systemd_format_vars = {
-            "virtualenv_bin": shlex.quote(f'{os.path.join(virtualenv_dir, "bin")}{os.path.sep}'),
-            "instance_number": "%i",
-            "systemd_user_group": "",
+            **config_format_vars,
             "systemd_exec_reload": exec_reload or "",
             "systemd_memory_limit": memory_limit or "",
             "systemd_description": systemd_service.description,
-            "systemd_target": self.__target_unit_name(config),
         }
-        if not self.user_mode:
-            systemd_format_vars["systemd_user_group"] = f"User={config.galaxy_user}"
-            if config.galaxy_group is not None:
-                systemd_format_vars["systemd_user_group"] += f"\nGroup={config.galaxy_group}"
 
         format_vars = self._service_format_vars(config, service, systemd_format_vars)
 
         unit_file = systemd_service.unit_file_name
         conf = os.path.join(self.__systemd_unit_dir, unit_file)
         template = SYSTEMD_SERVICE_TEMPLATE
-        contents = template.format(**format_vars)
-        self._update_file(conf, contents, unit_file, "systemd unit", force)
+        contents = template.format_map(format_vars)
+        return self._update_file(conf, contents, unit_file, "systemd unit", force)
 
     def __process_config(self, config, force):
+        """Write the unit files for a config.
+
+        Returns whether any unit file changed, and the path of the target unit if it changed and needs enabling.
+        """
+        changed = False
         service_units = []
+        config_format_vars = self.__config_format_vars(config)
         for service in config.services:
-            systemd_service = SystemdService(config, service, self._use_instance_name)
-            self.__update_service(config, service, systemd_service, force)
+            systemd_service = self.__systemd_service(config, service)
+            if self.__update_service(config, service, systemd_service, config_format_vars, force):
+                changed = True
             service_units.extend(systemd_service.unit_names)
 
         # create systemd target
@@ -288,15 +321,49 @@ class SystemdProcessManager(BaseProcessManager):
         }
         if self._use_instance_name:
             format_vars["systemd_description"] += f" {config.instance_name}"
-        contents = SYSTEMD_TARGET_TEMPLATE.format(**format_vars)
+        contents = SYSTEMD_TARGET_TEMPLATE.format_map(format_vars)
         if self._update_file(target_conf, contents, target_unit_name, "systemd unit", force):
+            return True, target_conf
+        return changed, None
+
+    def __config_processed(self, changed, target_conf):
+        if changed:
+            self._service_changes = True
+        if target_conf:
             self.__systemctl("enable", target_conf)
 
     def __process_configs(self, configs, force):
-        for config in configs:
-            self.__process_config(config, force)
+        if len(configs) < 2:
+            for config in configs:
+                self.__config_processed(*self.__process_config(config, force))
+            return
+        # unit files for different configs do not overlap, so configs can be processed concurrently. workers only write
+        # files and return their results, shared state is updated and targets are enabled here as each config finishes,
+        # so that a failure in one config does not prevent the units already written for the others from being enabled.
+        error = None
+        with ThreadPoolExecutor(max_workers=min(PROCESS_CONFIGS_MAX_WORKERS, len(configs))) as executor:
+            futures = [executor.submit(self.__process_config, config, force) for config in configs]
+            for future in as_completed(futures):
+                try:
+                    self.__config_processed(*future.result())
+                except Exception as exc:
+                    if error is None:
+                        error = exc
+        if error is not None:
+            raise error
 
     def __unit_names(self, configs, service_names, use_target=True, include_services=False):
+        service_names = frozenset(service_names or ())
+        # e.g. start, stop and restart of specific services look up the same unit names twice, once for the command and
+        # once for status. use_target and include_services only matter when no service names are given, so normalize
+        # them to make those lookups share a cache entry.
+        use_target = use_target and not service_names
+        include_services = include_services and use_target
+        key = (tuple(c.instance_name for c in configs), service_names, use_target, include_services)
+        try:
+            return list(self.__unit_names_cache[key])
+        except KeyError:
+            pass
         unit_names = []
         for config in configs:
             services = config.services
@@ -306,15 +373,15 @@ class SystemdProcessManager(BaseProcessManager):
                     services = []
             elif service_names:
                 services = config.get_services(service_names)
-            systemd_services = [SystemdService(config, s, self._use_instance_name) for s in services]
-            for systemd_service in systemd_services:
-                unit_names.extend(systemd_service.unit_names)
+            for service in services:
+                unit_names.extend(self.__systemd_service(config, service).unit_names)
+        self.__unit_names_cache[key] = tuple(unit_names)
         return unit_names
 
     def follow(self, configs=None, service_names=None, quiet=False):
         """ """
         unit_names = self.__unit_names(configs, service_names, use_target=False)
-        u_args = [i for sl in list(zip(["-u"] * len(unit_names), unit_names)) for i in sl]
+        u_args = chain.from_iterable(("-u", u) for u in unit_names)
         self.__journalctl("-f", *u_args)
 
     def start(self, configs=None, service_names=None):
@@ -338,23 +405,28 @@ class SystemdProcessManager(BaseProcessManager):
         self.__systemctl("restart", *unit_names, not_found_rc=(5,))
         self.status(configs=configs, service_names=service_names)
 
-    def __graceful_service(self, config, service, service_names):
-        systemd_service = SystemdService(config, service, self._use_instance_name)
-        if service.graceful_method == GracefulMethod.ROLLING:
-            restart_callbacks = list(partial(self.__systemctl, "reload-or-restart", u) for u in systemd_service.unit_names)
-            service.rolling_restart(restart_callbacks)
-        elif service.graceful_method != GracefulMethod.NONE:
-            self.__systemctl("reload-or-restart", *systemd_service.unit_names, not_found_rc=(5,))
-            gravity.io.info(f"Restarted: {', '.join(systemd_service.unit_names)}")
-
     def graceful(self, configs=None, service_names=None):
         """ """
         self.update(configs=configs)
         # reload-or-restart on a target does a restart on its services, so we use the services directly
+        unit_names = []
+        rolling_services = []
         for config in configs:
             services = config.get_services(service_names)
             for service in services:
-                self.__graceful_service(config, service, service_names)
+                systemd_service = self.__systemd_service(config, service)
+                if service.graceful_method == GracefulMethod.ROLLING:
+                    rolling_services.append((service, systemd_service))
+                elif service.graceful_method != GracefulMethod.NONE:
+                    unit_names.extend(systemd_service.unit_names)
+        # systemctl accepts multiple units, so reload all non-rolling services in a single call. this is done before the
+        # rolling restarts, which can take a long time waiting for each process to become ready.
+        if unit_names:
+            self.__systemctl("reload-or-restart", *unit_names, not_found_rc=(5,))
+            gravity.io.info(f"Restarted: {', '.join(unit_names)}")
+        for service, systemd_service in rolling_services:
+            restart_callbacks = list(partial(self.__systemctl, "reload-or-restart", u) for u in systemd_service.unit_names)
+            service.rolling_restart(restart_callbacks)
 
     def status(self, configs=None, service_names=None):
         """ """
@@ -366,13 +438,19 @@ class SystemdProcessManager(BaseProcessManager):
 
     def update(self, configs=None, force=False, clean=False):
         """ """
-        self._pre_update(configs, force, clean)
-        if not clean:
-            self.__process_configs(configs, force)
-        if self._service_changes:
-            self.__systemctl("daemon-reload")
-        else:
-            gravity.io.debug("No service changes, daemon-reload not performed")
+        # start/restart/graceful call update, so changes from a previous update must not trigger another daemon-reload
+        self._service_changes = False
+        self.__unit_names_cache.clear()
+        try:
+            self._pre_update(configs, force, clean)
+            if not clean:
+                self.__process_configs(configs, force)
+        finally:
+            # reload even if processing a config failed, so that the changes made for the others take effect
+            if self._service_changes:
+                self.__systemctl("daemon-reload")
+            else:
+                gravity.io.debug("No service changes, daemon-reload not performed")
 
     def shutdown(self):
         """ """
@@ -198,7 +198,7 @@ class Service(BaseModel):
         for setting, value in self.settings.items():
             if setting in self.command_arguments:
                 if value:
-                    rval[setting] = self.command_arguments[setting].format(**format_vars)
+                    rval[setting] = self.command_arguments[setting].format_map(format_vars)
                 else:
                     rval[setting] = ""
             else:
@@ -520,4 +520,4 @@ SERVICE_CLASS_MAP = {
     "standalone": GalaxyStandaloneService,
 }
 
-VALID_SERVICE_NAMES = set(SERVICE_CLASS_MAP)
+VALID_SERVICE_NAMES = frozenset(SERVICE_CLASS_MAP)
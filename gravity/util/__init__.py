@@ -1,5 +1,6 @@
 """
 """
+import asyncio
 import collections.abc
 import copy
 import os
@@ -10,8 +11,19 @@ import requests
 import requests_unixsocket
 import yaml
 
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+import gravity.io
 from gravity.settings import Settings
 
+# whether follow_files() can be used, otherwise callers should fall back to `tail -f`. inotify_simple can be imported on
+# any platform, but inotify itself is Linux-only.
+INOTIFY_AVAILABLE = inotify_simple is not None and sys.platform.startswith("linux")
+FOLLOW_INITIAL_LINES = 10
+
 
 def recursive_update(to_update, update_from):
     """
@@ -38,6 +50,91 @@ def which(file):
     return None
 
 
+def _last_lines(fh, count):
+    """Return the last count lines of a binary file handle, leaving the handle positioned at the end of the file."""
+    end = fh.seek(0, os.SEEK_END)
+    position = end
+    data = b""
+    while position > 0 and data.count(b"\n") <= count:
+        step = min(4096, position)
+        position -= step
+        fh.seek(position)
+        data = fh.read(step) + data
+    fh.seek(end)
+    return b"".join(data.splitlines(keepends=True)[-count:])
+
+
+async def _follow_files(paths, out, inotify):
+    handles = {}
+    watches = {}
+    last_path = None
+
+    def write(path, data):
+        nonlocal last_path
+        # like tail, label output with the file it came from whenever more than one file is followed
+        if len(handles) > 1 and path != last_path:
+            header = f"==> {path} <==\n"
+            if last_path is not None:
+                header = "\n" + header
+            out.write(header.encode())
+        last_path = path
+        out.write(data)
+        out.flush()
+
+    loop = asyncio.get_running_loop()
+    modified = asyncio.Event()
+    try:
+        for path in paths:
+            try:
+                handles[path] = open(path, "rb")
+            except OSError as exc:
+                gravity.io.warn(f"Cannot follow {path}: {exc}")
+                continue
+            watches[inotify.add_watch(path, inotify_simple.flags.MODIFY)] = path
+        if not handles:
+            gravity.io.exception("No log files to follow")
+        for path, fh in handles.items():
+            write(path, _last_lines(fh, FOLLOW_INITIAL_LINES))
+        loop.add_reader(inotify.fileno(), modified.set)
+        while True:
+            await modified.wait()
+            modified.clear()
+            for event in inotify.read(timeout=0):
+                path = watches.get(event.wd)
+                if path is None:
+                    # e.g. queue overflow events, which are not associated with a watch (wd -1)
+                    continue
+                fh = handles[path]
+                if os.fstat(fh.fileno()).st_size < fh.tell():
+                    gravity.io.warn(f"{path}: file truncated")
+                    fh.seek(0)
+                data = fh.read()
+                if data:
+                    write(path, data)
+    finally:
+        loop.remove_reader(inotify.fileno())
+        inotify.close()
+        for fh in handles.values():
+            fh.close()
+
+
+def follow_files(paths):
+    """Print the last lines of the given files and then any data appended to them, like ``tail -f``.
+
+    All files are watched with inotify in a single event loop. Requires the optional ``inotify_simple`` package, check
+    ``INOTIFY_AVAILABLE`` first. Returns ``False`` without following the files if an inotify instance cannot be created
+    (e.g. because ``fs.inotify.max_user_instances`` has been reached), in which case callers should fall back to ``tail
+    -f``.
+    """
+    try:
+        inotify = inotify_simple.INotify()
+    except OSError as exc:
+        gravity.io.debug(f"Unable to initialize inotify: {exc}")
+        return False
+    asyncio.run(_follow_files(paths, sys.stdout.buffer, inotify))
+    return True
+
+
 def settings_to_sample():
     schema = Settings.schema_json()
     # expand schema for easier processing
@@ -46,6 +46,9 @@ setup(
         "requests",
         "requests-unixsocket",
     ],
+    extras_require={
+        "inotify": ["inotify_simple; sys_platform == 'linux'"],
+    },
     entry_points={"console_scripts": [
         "galaxy = gravity.cli:galaxy",
         "galaxyctl = gravity.cli:galaxyctl",
@@ -109,4 +109,21 @@ def test_gunicorn_graceful_method_no_preload(galaxy_yml, default_config_manager)
     assert graceful_method == GracefulMethod.SIGHUP
 
 
+def test_get_configs_cache_invalidated_on_load(tmp_path, default_config_manager):
+    for instance_name in ("one", "two"):
+        config_file = tmp_path / f"{instance_name}.yml"
+        config_file.write_text(json.dumps({
+            'galaxy': None,
+            'gravity': {'instance_name': instance_name, 'galaxy_root': str(tmp_path), 'galaxy_user': 'galaxy'},
+        }))
+        default_config_manager.load_config_file(str(config_file))
+        configs = default_config_manager.get_configs()
+        assert configs[-1].instance_name == instance_name
+        # callers may modify the returned list without affecting later calls
+        configs.clear()
+    assert [c.instance_name for c in default_config_manager.get_configs()] == ["one", "two"]
+    assert [c.instance_name for c in default_config_manager.get_configs(instances=["two"])] == ["two"]
+    assert "gunicorn" in default_config_manager.get_configured_service_names()
+
+
 # TODO: tests for switching process managers between supervisor and systemd
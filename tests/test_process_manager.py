@@ -1,13 +1,19 @@
 import json
 import os
+import stat
 import time
 import string
+import subprocess
 from pathlib import Path
 
 import pytest
+from click import ClickException
 from gravity import process_manager
+from gravity.process_manager import FILE_COMPARE_CHUNK_SIZE, FILE_COMPARE_STREAM_SIZE
 from gravity.process_manager.supervisor import supervisor_program_names
+from gravity.process_manager.systemd import SystemdProcessManager
 from gravity.settings import GX_IT_PROXY_MIN_VERSION
+from gravity.state import ServiceList
 from yaml import safe_load
 
 
@@ -496,4 +502,183 @@ def test_supervisor_program_names():
     assert supervisor_program_names("gunicorn", 2, 8080, instance_name="main") == ["main:gunicorn8080", "main:gunicorn8081"]
 
 
+@pytest.fixture()
+def systemd_pm(default_config_manager):
+    return SystemdProcessManager(config_manager=default_config_manager)
+
+
+def test_file_needs_update_large_file(tmp_path, systemd_pm):
+    contents = "x" * (FILE_COMPARE_STREAM_SIZE + FILE_COMPARE_CHUNK_SIZE + 1)
+    path = tmp_path / "large.service"
+    path.write_text(contents)
+    assert not systemd_pm._file_needs_update(str(path), contents)
+    # same size, differing only in the last chunk
+    assert systemd_pm._file_needs_update(str(path), contents[:-1] + "y")
+    # differing only in the first chunk
+    assert systemd_pm._file_needs_update(str(path), "y" + contents[1:])
+    assert systemd_pm._file_needs_update(str(path), contents + "x")
+    assert systemd_pm._file_needs_update(str(tmp_path / "missing.service"), contents)
+
+
+def test_file_needs_update_non_ascii(tmp_path, systemd_pm):
+    contents = "Environment=GALAXY_ROOT=/srv/gal\u00e1xia\n"
+    path = tmp_path / "galaxy.service"
+    systemd_pm._write_file(str(path), contents)
+    # written as UTF-8 regardless of the locale, so the size check matches the encoded contents
+    assert path.read_bytes() == contents.encode("utf-8")
+    assert not systemd_pm._file_needs_update(str(path), contents)
+
+
+def test_write_file_preserves_mode(tmp_path, systemd_pm):
+    path = tmp_path / "galaxy.service"
+    path.write_text("old")
+    path.chmod(0o600)
+    systemd_pm._write_file(str(path), "new", stat_result=os.stat(path))
+    assert path.read_text() == "new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == ["galaxy.service"]
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="changing file ownership requires root")
+def test_write_file_preserves_ownership(tmp_path, systemd_pm):
+    path = tmp_path / "galaxy.service"
+    path.write_text("old")
+    os.chown(path, 65534, 65534)
+    systemd_pm._write_file(str(path), "new", stat_result=os.stat(path))
+    stat_result = os.stat(path)
+    assert (stat_result.st_uid, stat_result.st_gid) == (65534, 65534)
+
+
+def test_write_file_follows_symlink(tmp_path, systemd_pm):
+    target = tmp_path / "target" / "galaxy.service"
+    target.parent.mkdir()
+    target.write_text("old")
+    link = tmp_path / "galaxy.service"
+    link.symlink_to(target)
+    systemd_pm._write_file(str(link), "new", stat_result=os.stat(link))
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+    assert sorted(os.listdir(tmp_path)) == ["galaxy.service", "target"]
+    assert os.listdir(target.parent) == ["galaxy.service"]
+
+
+def test_write_file_failure_removes_temp_file(tmp_path, systemd_pm, monkeypatch):
+    path = tmp_path / "galaxy.service"
+    path.write_text("old")
+
+    def fail_fsync(fd):
+        raise OSError("fsync failed")
+
+    monkeypatch.setattr(os, "fsync", fail_fsync)
+    with pytest.raises(OSError, match="fsync failed"):
+        systemd_pm._write_file(str(path), "new", stat_result=os.stat(path))
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["galaxy.service"]
+
+
+@pytest.fixture()
+def systemctl_calls(tmp_path, monkeypatch):
+    """Record systemctl calls rather than making them, and write unit files to a temporary directory."""
+    calls = []
+
+    def check_call(args, **kwargs):
+        calls.append(args)
+
+    def check_output(args, **kwargs):
+        calls.append(args)
+        return "PATH=/usr/bin:/bin\n" if "show-environment" in args else ""
+
+    monkeypatch.setenv("GRAVITY_SYSTEMD_UNIT_PATH", str(tmp_path / "units"))
+    monkeypatch.setattr(subprocess, "check_call", check_call)
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    return calls
+
+
+def load_systemd_configs(config_manager, config_dir, instance_names, **gravity_settings):
+    for instance_name in instance_names:
+        config_file = config_dir / f"{instance_name}.yml"
+        gravity_config = {
+            'process_manager': 'systemd',
+            'service_command_style': 'direct',
+            'instance_name': instance_name,
+            'galaxy_root': str(config_dir),
+            'galaxy_user': 'galaxy',
+            'virtualenv': str(config_dir / 'venv'),
+        }
+        gravity_config.update(gravity_settings.get(instance_name, {}))
+        config_file.write_text(json.dumps({'galaxy': None, 'gravity': gravity_config}))
+        config_manager.load_config_file(str(config_file))
+
+
+def systemctl_commands(calls, command):
+    return [args for args in calls if args[0] == "systemctl" and command in args]
+
+
+def test_systemd_update_daemon_reload(tmp_path, default_config_manager, systemctl_calls):
+    load_systemd_configs(default_config_manager, tmp_path, ["one", "two"])
+    unit_dir = tmp_path / "units"
+    with process_manager.process_manager(config_manager=default_config_manager) as pm:
+        pm.update()
+        assert len(systemctl_commands(systemctl_calls, "daemon-reload")) == 1
+        assert len(systemctl_commands(systemctl_calls, "enable")) == 2
+        # nothing changed
+        systemctl_calls.clear()
+        pm.update()
+        assert not systemctl_commands(systemctl_calls, "daemon-reload")
+        assert not systemctl_commands(systemctl_calls, "enable")
+        # removing a unit file that is no longer intended is a change
+        unintended = unit_dir / "galaxy-one-unintended.service"
+        unintended.write_text("")
+        systemctl_calls.clear()
+        pm.update()
+        assert not unintended.exists()
+        assert len(systemctl_commands(systemctl_calls, "daemon-reload")) == 1
+
+
+def test_systemd_update_config_failure(tmp_path, default_config_manager, systemctl_calls, monkeypatch):
+    monkeypatch.delenv("VIRTUAL_ENV", raising=False)
+    load_systemd_configs(default_config_manager, tmp_path, ["one", "two"], two={'virtualenv': None})
+    with process_manager.process_manager(config_manager=default_config_manager) as pm:
+        with pytest.raises(ClickException, match="virtualenv"):
+            pm.update()
+    # the config that could be processed is still enabled and loaded
+    target = str(tmp_path / "units" / "galaxy-one.target")
+    assert os.path.exists(target)
+    assert [args[-1] for args in systemctl_commands(systemctl_calls, "enable")] == [target]
+    assert len(systemctl_commands(systemctl_calls, "daemon-reload")) == 1
+
+
+def test_systemd_unit_names_cached(tmp_path, default_config_manager, systemctl_calls):
+    load_systemd_configs(default_config_manager, tmp_path, ["one", "two"])
+    with process_manager.process_manager(config_manager=default_config_manager) as pm:
+        pm.stop(instance_names=["celery"])
+        systemd_pm = pm.process_managers["systemd"]
+        unit_names_cache = systemd_pm._SystemdProcessManager__unit_names_cache
+        # stop and the status call that follows it look up the same units
+        assert len(unit_names_cache) == 1
+        units = ["galaxy-one-celery.service", "galaxy-two-celery.service"]
+        assert systemctl_commands(systemctl_calls, "stop")[0][-2:] == units
+        assert systemctl_commands(systemctl_calls, "status")[0][-2:] == units
+
+
+def test_systemd_graceful_order(tmp_path, default_config_manager, systemctl_calls, monkeypatch):
+    def rolling_restart(self, restart_callbacks):
+        systemctl_calls.append(["rolling_restart", self.service_name])
+
+    monkeypatch.setattr(ServiceList, "rolling_restart", rolling_restart)
+    load_systemd_configs(default_config_manager, tmp_path, ["one"], one={
+        'service_command_style': 'gravity',
+        'gunicorn': [{'bind': 'localhost:8080'}, {'bind': 'localhost:8081'}],
+        'celery': {'enable': True},
+    })
+    with process_manager.process_manager(config_manager=default_config_manager) as pm:
+        pm.graceful()
+    graceful_calls = [args for args in systemctl_calls if "reload-or-restart" in args or args[0] == "rolling_restart"]
+    # non-rolling services are reloaded in one call, before the rolling restarts that can block for a long time
+    assert [args[-3:] for args in graceful_calls] == [
+        ["reload-or-restart", "galaxy-one-celery.service", "galaxy-one-celery-beat.service"],
+        ["rolling_restart", "gunicorn"],
+    ]
+
+
 # TODO: test switching PMs in between invocations, test multiple instances
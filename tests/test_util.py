@@ -0,0 +1,104 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from gravity import util
+from gravity.util import FOLLOW_INITIAL_LINES, INOTIFY_AVAILABLE, _follow_files, _last_lines, follow_files
+
+requires_inotify = pytest.mark.skipif(not INOTIFY_AVAILABLE, reason="inotify is not available")
+
+
+def follow(paths, action, timeout=1):
+    """Follow paths while running action, returning everything written until timeout."""
+    out = BytesIO()
+
+    async def main():
+        task = asyncio.ensure_future(action())
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(_follow_files(paths, out, util.inotify_simple.INotify()), timeout)
+        await task
+
+    asyncio.run(main())
+    return out.getvalue()
+
+
+def lines(start, stop):
+    return "".join(f"line {i}\n" for i in range(start, stop))
+
+
+@pytest.mark.parametrize("count", [0, 5, 15, 2000])
+def test_last_lines(tmp_path, count):
+    path = tmp_path / "test.log"
+    path.write_text(lines(0, count))
+    with open(path, "rb") as fh:
+        assert _last_lines(fh, FOLLOW_INITIAL_LINES) == lines(max(0, count - FOLLOW_INITIAL_LINES), count).encode()
+        assert fh.tell() == path.stat().st_size
+
+
+def test_last_lines_no_trailing_newline(tmp_path):
+    path = tmp_path / "test.log"
+    path.write_text(lines(0, 20) + "partial")
+    with open(path, "rb") as fh:
+        assert _last_lines(fh, 2) == b"line 19\npartial"
+
+
+@requires_inotify
+def test_follow_files(tmp_path):
+    path = tmp_path / "test.log"
+    path.write_text(lines(0, 20))
+
+    async def action():
+        await asyncio.sleep(0.2)
+        with open(path, "a") as fh:
+            fh.write(lines(20, 22))
+
+    assert follow([str(path)], action) == lines(10, 22).encode()
+
+
+@requires_inotify
+def test_follow_files_multiple(tmp_path):
+    path1 = tmp_path / "one.log"
+    path2 = tmp_path / "two.log"
+    path1.write_text("one\n")
+    path2.write_text("two\n")
+
+    async def action():
+        await asyncio.sleep(0.2)
+        with open(path1, "a") as fh:
+            fh.write("three\n")
+
+    assert follow([str(path1), str(path2)], action) == (
+        f"==> {path1} <==\none\n\n==> {path2} <==\ntwo\n\n==> {path1} <==\nthree\n"
+    ).encode()
+
+
+@requires_inotify
+def test_follow_files_truncated(tmp_path):
+    path = tmp_path / "test.log"
+    path.write_text(lines(0, 3))
+
+    async def action():
+        await asyncio.sleep(0.2)
+        path.write_text("new\n")
+
+    assert follow([str(path)], action) == (lines(0, 3) + "new\n").encode()
+
+
+@requires_inotify
+def test_follow_files_missing(tmp_path):
+    path = tmp_path / "test.log"
+    path.write_text("line\n")
+
+    async def action():
+        pass
+
+    assert follow([str(tmp_path / "missing.log"), str(path)], action, timeout=0.2) == b"line\n"
+
+
+@requires_inotify
+def test_follow_files_inotify_unavailable(tmp_path, monkeypatch):
+    def fail():
+        raise OSError("Too many open files")
+
+    monkeypatch.setattr(util.inotify_simple, "INotify", fail)
+    assert follow_files([str(tmp_path / "test.log")]) is False